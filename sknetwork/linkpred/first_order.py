@@ -5,27 +5,44 @@ Created on May, 2020
 @author: Nathan de Lara <ndelara@enst.fr>
 """
 from abc import ABC
-from typing import Union, Iterable
+from typing import Union, Iterable, Tuple
 
 import numpy as np
 from scipy import sparse
-from sknetwork.linkpred.first_order_core import common_neighbors_node_core, jaccard_node_core, salton_node_core, \
-    sorensen_node_core, hub_promoted_node_core, hub_depressed_node_core, adamic_adar_node_core, \
-    resource_allocation_node_core, \
-    common_neighbors_edges_core, jaccard_edges_core, salton_edges_core, sorensen_edges_core, hub_promoted_edges_core, \
-    hub_depressed_edges_core, adamic_adar_edges_core, resource_allocation_edges_core
+from sknetwork.linkpred.first_order_core import intersections_node_core, intersections_edges_core, \
+    weighted_intersections_node_core, weighted_intersections_edges_core, intersections_batch_core, \
+    weighted_intersections_batch_core
 
 from sknetwork.linkpred.base import BaseLinkPred
-from sknetwork.utils.check import check_format
+from sknetwork.utils.check import check_format, check_square
+
+
+def _divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Element-wise division, with 0 where the denominator is null."""
+    shape = np.broadcast(numerator, denominator).shape
+    return np.divide(numerator, denominator, out=np.zeros(shape), where=denominator != 0)
+
+
+def _check_nodes(nodes: np.ndarray, n: int):
+    """Check that node indices are in range, before they reach the kernels (which do not check bounds)."""
+    if np.any(nodes < 0) or np.any(nodes >= n):
+        raise ValueError('Node indices must be between 0 and {}.'.format(n - 1))
 
 
 class FirstOrder(BaseLinkPred, ABC):
     """Base class for first order algorithms."""
+    # queries on more than batch_threshold nodes use the sparse product of the adjacency with its transpose
+    batch_threshold = 16
+    bitset_threshold = 256
 
     def __init__(self):
         super(FirstOrder, self).__init__()
         self.indptr_ = None
         self.indices_ = None
+        self.degrees_ = None
+        self.weights_ = None
+        self._bitset_cache = None
+        self._pattern_cache = None
 
     def fit(self, adjacency: Union[sparse.csr_matrix, np.ndarray]):
         """Fit algorithm to the data.
@@ -40,16 +57,207 @@ class FirstOrder(BaseLinkPred, ABC):
         self : :class:`FirstOrder`
         """
         adjacency = check_format(adjacency)
-        adjacency.sort_indices()
-        self.indptr_ = adjacency.indptr.astype(np.int32)
-        self.indices_ = adjacency.indices.astype(np.int32)
+        check_square(adjacency)
+        if not adjacency.has_sorted_indices:
+            adjacency.sort_indices()
+        # no copy if already in int32
+        self.indptr_ = adjacency.indptr.astype(np.int32, copy=False)
+        # neighbors (column indices) on 16 bits for small graphs, halving the memory read by the kernels
+        index_dtype = np.uint16 if adjacency.shape[1] <= np.iinfo(np.uint16).max + 1 else np.int32
+        self.indices_ = adjacency.indices.astype(index_dtype, copy=False)
+        self.degrees_ = np.diff(self.indptr_).astype(np.int32)
+        self._bitset_cache = None
+        self._pattern_cache = None
 
         return self
 
+    def _bitsets(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Neighborhoods of hubs as bitsets, built on first call.
+
+        Hubs are nodes of degree larger than both ``bitset_threshold`` and the number of 64-bit words needed to store
+        a bitset of size n, so that the memory used by the bitsets is at most 8 bytes per edge. Queries on single nodes
+        or edges involving a hub test neighbors against its bitset instead of merging neighbor lists.
+
+        Returns
+        -------
+        hub_index : np.ndarray
+            Index of each node in the array of bitsets (-1 if not a hub).
+        bitsets : np.ndarray
+            Bitsets of shape (n_hubs, n_words), with bit j of hub i set if j is a neighbor of i.
+        """
+        if self._bitset_cache is None:
+            n = self.indptr_.shape[0] - 1
+            n_words = (n + 63) // 64
+            hubs = np.flatnonzero(self.degrees_ > max(self.bitset_threshold, n_words))
+            hub_index = -np.ones(n, dtype=np.int32)
+            hub_index[hubs] = np.arange(len(hubs), dtype=np.int32)
+            bitsets = np.zeros((len(hubs), n_words), dtype=np.uint64)
+            if len(hubs):
+                rows = hub_index[np.repeat(np.arange(n), self.degrees_)]
+                mask = rows >= 0
+                rows, cols = rows[mask].astype(np.int64), self.indices_[mask].astype(np.int64)
+                bits = np.left_shift(np.uint64(1), (cols & 63).astype(np.uint64))
+                # neighbors are sorted, so that the bits of each word of each hub are contiguous
+                keys = rows * n_words + (cols >> 6)
+                starts = np.flatnonzero(np.diff(keys, prepend=-1))
+                bitsets.flat[keys[starts]] = np.bitwise_or.reduceat(bits, starts)
+            self._bitset_cache = hub_index, bitsets
+        return self._bitset_cache
+
+    def _patterns(self) -> Tuple[sparse.csr_matrix, sparse.csr_matrix]:
+        """Factors of the sparse product giving the numbers of common neighbors, built on first call.
+
+        Returns
+        -------
+        left : sparse.csr_matrix
+            Binary adjacency :math:`A`, or :math:`AW` if ``weights_`` is set.
+        right : sparse.csr_matrix
+            Transpose of the binary adjacency :math:`A^T`, in CSR format.
+        """
+        if self._pattern_cache is None:
+            n = self.indptr_.shape[0] - 1
+            data = np.ones(self.indices_.shape[0], dtype=np.int64 if self.weights_ is None else np.float32)
+            pattern = sparse.csr_matrix((data, self.indices_.astype(np.int32), self.indptr_), shape=(n, n))
+            left = pattern
+            if self.weights_ is not None:
+                left = pattern.dot(sparse.diags(self.weights_, format='csr'))
+            self._pattern_cache = left, pattern.T.tocsr()
+        return self._pattern_cache
+
+    def _sparse_intersections(self, sources: np.ndarray) -> sparse.csr_matrix:
+        """Size of the intersection of the neighborhood of each source with that of each node, as rows of the sparse
+        matrix :math:`AA^T` (binary adjacency). If ``weights_`` is set, each common neighbor :math:`z` counts for
+        :math:`w_z` (:math:`AWA^T` with :math:`W` the diagonal matrix of weights)."""
+        left, right = self._patterns()
+        return left[sources].dot(right)
+
+    def _intersections(self, sources: np.ndarray, parallel: bool = False) -> np.ndarray:
+        """Size of the intersection of the neighborhood of each source with that of each node, as a dense array.
+        If ``parallel``, use the Cython kernels instead of a sparse product: each row is accumulated from the
+        in-neighbors of the neighbors of its source, in parallel over sources."""
+        if not parallel:
+            return self._sparse_intersections(sources).toarray()
+        n = self.indptr_.shape[0] - 1
+        sources = self._coerce_targets(sources)
+        # in-neighbors of each node, from the transpose of the adjacency
+        _, transpose = self._patterns()
+        indptr_transpose = transpose.indptr.astype(np.int32, copy=False)
+        indices_transpose = transpose.indices.astype(self.indices_.dtype, copy=False)
+        counts = self._empty_counts((len(sources), n))
+        if self.weights_ is None:
+            intersections_batch_core(self.indptr_, self.indices_, indptr_transpose, indices_transpose, sources, counts)
+        else:
+            weighted_intersections_batch_core(self.indptr_, self.indices_, indptr_transpose, indices_transpose, sources,
+                                              self.weights_, counts)
+        return counts
+
+    def _normalize(self, counts: np.ndarray, degrees_sources: np.ndarray, degrees_targets: np.ndarray) -> np.ndarray:
+        """Scores from the numbers of common neighbors and the degrees of the nodes (broadcast together).
+        Scores must be null for pairs of nodes without common neighbors."""
+        return counts
+
+    def _counts_base(self, source: int, targets: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """Numbers (or total weights) of common neighbors of a single node with multiple targets, written in ``out``."""
+        hub_index, bitsets = self._bitsets()
+        if self.weights_ is None:
+            intersections_node_core(self.indptr_, self.indices_, hub_index, bitsets, np.int32(source), targets, out)
+        else:
+            weighted_intersections_node_core(self.indptr_, self.indices_, hub_index, bitsets, np.int32(source), targets,
+                                             self.weights_, out)
+        return out
+
+    def _empty_counts(self, shape) -> np.ndarray:
+        """Buffer for numbers (or total weights) of common neighbors."""
+        return np.empty(shape, dtype=np.int64 if self.weights_ is None else np.float32)
+
+    def _predict_base(self, source: int, targets: np.ndarray):
+        """Prediction for a single node and multiple targets (contiguous int32 array)."""
+        counts = self._counts_base(source, targets, self._empty_counts(len(targets)))
+        return self._normalize(counts, self.degrees_[source], self.degrees_[targets])
+
+    def _predict_edges(self, edges: np.ndarray):
+        """Prediction for multiple edges. Duplicate edges are scored once, and edges are sorted by source so that
+        consecutive edges share the neighborhood of their source."""
+        n = self.indptr_.shape[0] - 1
+        # out-of-range nodes would be encoded as other pairs
+        _check_nodes(edges, n)
+        keys, inverse = np.unique(edges[:, 0].astype(np.int64) * n + edges[:, 1], return_inverse=True)
+        edges = np.ascontiguousarray(np.stack([keys // n, keys % n], axis=1), dtype=np.int32)
+        hub_index, bitsets = self._bitsets()
+        counts = self._empty_counts(len(edges))
+        if self.weights_ is None:
+            intersections_edges_core(self.indptr_, self.indices_, hub_index, bitsets, edges, counts)
+        else:
+            weighted_intersections_edges_core(self.indptr_, self.indices_, hub_index, bitsets, edges, self.weights_,
+                                              counts)
+        return self._normalize(counts, self.degrees_[edges[:, 0]], self.degrees_[edges[:, 1]])[inverse]
+
+    def _predict_batch(self, sources: np.ndarray, parallel: bool = False):
+        """Prediction for multiple sources and all targets."""
+        counts = self._intersections(sources, parallel=parallel)
+        return self._normalize(counts, self.degrees_[sources][:, np.newaxis], self.degrees_)
+
+    def predict_all(self, return_sparse: Union[bool, str] = 'auto') -> Union[np.ndarray, sparse.csr_matrix]:
+        """Compute similarity scores for all pairs of nodes.
+
+        Parameters
+        ----------
+        return_sparse :
+            * If ``True``, return a sparse matrix, with non-zero scores for pairs of nodes with common neighbors only.
+            * If ``False``, return a dense array, computed in parallel over source nodes.
+            * If ``'auto'``, return a sparse matrix if less than half of the pairs of nodes have common neighbors,
+              a dense array otherwise.
+
+        Returns
+        -------
+        predictions : np.ndarray or sparse.csr_matrix
+            Prediction scores, of shape (n_nodes, n_nodes).
+        """
+        if not (isinstance(return_sparse, bool) or return_sparse == 'auto'):
+            raise ValueError("return_sparse must be True, False or 'auto'.")
+        n = self.indptr_.shape[0] - 1
+        sources = np.arange(n, dtype=np.int32)
+        if return_sparse is False:
+            return self._predict_batch(sources, parallel=True)
+        counts = self._sparse_intersections(sources)
+        if return_sparse == 'auto' and counts.nnz >= n * n / 2:
+            return self._normalize(counts.toarray(), self.degrees_[:, np.newaxis], self.degrees_)
+        rows = np.repeat(sources, np.diff(counts.indptr))
+        counts.data = self._normalize(counts.data, self.degrees_[rows], self.degrees_[counts.indices])
+        counts.eliminate_zeros()
+        return counts
+
+    @staticmethod
+    def _coerce_targets(targets: Iterable) -> np.ndarray:
+        """Targets as a contiguous int32 array, as expected by the prediction kernels (no copy if already so)."""
+        return np.ascontiguousarray(targets, dtype=np.int32)
+
     def _predict_node(self, source: int):
         """Prediction for a single node."""
         n = self.indptr_.shape[0] - 1
-        return self._predict_base(source, np.arange(n))
+        _check_nodes(np.array(source), n)
+        if n > self.batch_threshold:
+            return self._predict_batch(np.array([source]))[0]
+        return self._predict_base(source, np.arange(n, dtype=np.int32))
+
+    def _predict_nodes(self, nodes: np.ndarray):
+        """Prediction for multiple nodes."""
+        # integer indices, also for an empty query
+        nodes = np.asarray(nodes, dtype=int)
+        n = self.indptr_.shape[0] - 1
+        _check_nodes(nodes, n)
+        if n > self.batch_threshold:
+            return self._predict_batch(nodes)
+        targets = np.arange(n, dtype=np.int32)
+        counts = self._empty_counts((len(nodes), n))
+        for i, node in enumerate(nodes):
+            self._counts_base(node, targets, counts[i])
+        return self._normalize(counts, self.degrees_[nodes][:, np.newaxis], self.degrees_)
+
+    def _predict_edge(self, source: int, target: int):
+        """Prediction for a single edge."""
+        _check_nodes(np.array([source, target]), self.indptr_.shape[0] - 1)
+        return self._predict_base(source, self._coerce_targets([target]))[0]
 
 
 class CommonNeighbors(FirstOrder):
@@ -63,6 +271,8 @@ class CommonNeighbors(FirstOrder):
         Pointer index for neighbors.
     indices_ : np.ndarray
         Concatenation of neighbors.
+    degrees_ : np.ndarray
+        Degree of each node.
 
     Examples
     --------
@@ -86,15 +296,6 @@ class CommonNeighbors(FirstOrder):
     def __init__(self):
         super(CommonNeighbors, self).__init__()
 
-    def _predict_base(self, source: int, targets: Iterable):
-        """Prediction for a single node."""
-        return np.asarray(common_neighbors_node_core(self.indptr_, self.indices_, np.int32(source),
-                                                     np.array(targets, dtype=np.int32))).astype(int)
-
-    def _predict_edges(self, edges: np.ndarray):
-        """Prediction for multiple edges."""
-        return np.asarray(common_neighbors_edges_core(self.indptr_, self.indices_, edges.astype(np.int32))).astype(int)
-
 
 class JaccardIndex(FirstOrder):
     """Link prediction by Jaccard Index:
@@ -107,6 +308,8 @@ class JaccardIndex(FirstOrder):
         Pointer index for neighbors.
     indices_ : np.ndarray
         Concatenation of neighbors.
+    degrees_ : np.ndarray
+        Degree of each node.
 
     Examples
     --------
@@ -135,13 +338,9 @@ class JaccardIndex(FirstOrder):
     def __init__(self):
         super(JaccardIndex, self).__init__()
 
-    def _predict_base(self, source: int, targets: Iterable):
-        """Prediction for a single node."""
-        return np.asarray(jaccard_node_core(self.indptr_, self.indices_, np.int32(source), np.array(targets, dtype=np.int32)))
-
-    def _predict_edges(self, edges: np.ndarray):
-        """Prediction for multiple edges."""
-        return np.asarray(jaccard_edges_core(self.indptr_, self.indices_, edges.astype(np.int32)))
+    def _normalize(self, counts: np.ndarray, degrees_sources: np.ndarray, degrees_targets: np.ndarray) -> np.ndarray:
+        """Scores from the numbers of common neighbors and the degrees of the nodes."""
+        return _divide(counts, degrees_sources + degrees_targets - counts)
 
 
 class SaltonIndex(FirstOrder):
@@ -155,6 +354,8 @@ class SaltonIndex(FirstOrder):
         Pointer index for neighbors.
     indices_ : np.ndarray
         Concatenation of neighbors.
+    degrees_ : np.ndarray
+        Degree of each node.
 
     Examples
     --------
@@ -185,13 +386,9 @@ class SaltonIndex(FirstOrder):
     def __init__(self):
         super(SaltonIndex, self).__init__()
 
-    def _predict_base(self, source: int, targets: Iterable):
-        """Prediction for a single node."""
-        return np.asarray(salton_node_core(self.indptr_, self.indices_, np.int32(source), np.array(targets, dtype=np.int32)))
-
-    def _predict_edges(self, edges: np.ndarray):
-        """Prediction for multiple edges."""
-        return np.asarray(salton_edges_core(self.indptr_, self.indices_, edges.astype(np.int32)))
+    def _normalize(self, counts: np.ndarray, degrees_sources: np.ndarray, degrees_targets: np.ndarray) -> np.ndarray:
+        """Scores from the numbers of common neighbors and the degrees of the nodes."""
+        return _divide(counts, np.sqrt(degrees_sources) * np.sqrt(degrees_targets))
 
 
 class SorensenIndex(FirstOrder):
@@ -205,6 +402,8 @@ class SorensenIndex(FirstOrder):
         Pointer index for neighbors.
     indices_ : np.ndarray
         Concatenation of neighbors.
+    degrees_ : np.ndarray
+        Degree of each node.
 
     Examples
     --------
@@ -240,13 +439,9 @@ class SorensenIndex(FirstOrder):
     def __init__(self):
         super(SorensenIndex, self).__init__()
 
-    def _predict_base(self, source: int, targets: Iterable):
-        """Prediction for a single node."""
-        return np.asarray(sorensen_node_core(self.indptr_, self.indices_, np.int32(source), np.array(targets, dtype=np.int32)))
-
-    def _predict_edges(self, edges: np.ndarray):
-        """Prediction for multiple edges."""
-        return np.asarray(sorensen_edges_core(self.indptr_, self.indices_, edges.astype(np.int32)))
+    def _normalize(self, counts: np.ndarray, degrees_sources: np.ndarray, degrees_targets: np.ndarray) -> np.ndarray:
+        """Scores from the numbers of common neighbors and the degrees of the nodes."""
+        return _divide(2 * counts, degrees_sources + degrees_targets)
 
 
 class HubPromotedIndex(FirstOrder):
@@ -260,6 +455,8 @@ class HubPromotedIndex(FirstOrder):
         Pointer index for neighbors.
     indices_ : np.ndarray
         Concatenation of neighbors.
+    degrees_ : np.ndarray
+        Degree of each node.
 
     Examples
     --------
@@ -290,14 +487,9 @@ class HubPromotedIndex(FirstOrder):
     def __init__(self):
         super(HubPromotedIndex, self).__init__()
 
-    def _predict_base(self, source: int, targets: Iterable):
-        """Prediction for a single node."""
-        return np.asarray(hub_promoted_node_core(self.indptr_, self.indices_, np.int32(source),
-                                                 np.array(targets, dtype=np.int32)))
-
-    def _predict_edges(self, edges: np.ndarray):
-        """Prediction for multiple edges."""
-        return np.asarray(hub_promoted_edges_core(self.indptr_, self.indices_, edges.astype(np.int32)))
+    def _normalize(self, counts: np.ndarray, degrees_sources: np.ndarray, degrees_targets: np.ndarray) -> np.ndarray:
+        """Scores from the numbers of common neighbors and the degrees of the nodes."""
+        return _divide(counts, np.minimum(degrees_sources, degrees_targets))
 
 
 class HubDepressedIndex(FirstOrder):
@@ -311,6 +503,8 @@ class HubDepressedIndex(FirstOrder):
         Pointer index for neighbors.
     indices_ : np.ndarray
         Concatenation of neighbors.
+    degrees_ : np.ndarray
+        Degree of each node.
 
     Examples
     --------
@@ -341,14 +535,9 @@ class HubDepressedIndex(FirstOrder):
     def __init__(self):
         super(HubDepressedIndex, self).__init__()
 
-    def _predict_base(self, source: int, targets: Iterable):
-        """Prediction for a single node."""
-        return np.asarray(hub_depressed_node_core(self.indptr_, self.indices_, np.int32(source),
-                                                  np.array(targets, dtype=np.int32)))
-
-    def _predict_edges(self, edges: np.ndarray):
-        """Prediction for multiple edges."""
-        return np.asarray(hub_depressed_edges_core(self.indptr_, self.indices_, edges.astype(np.int32)))
+    def _normalize(self, counts: np.ndarray, degrees_sources: np.ndarray, degrees_targets: np.ndarray) -> np.ndarray:
+        """Scores from the numbers of common neighbors and the degrees of the nodes."""
+        return _divide(counts, np.maximum(degrees_sources, degrees_targets))
 
 
 class AdamicAdar(FirstOrder):
@@ -362,6 +551,10 @@ class AdamicAdar(FirstOrder):
         Pointer index for neighbors.
     indices_ : np.ndarray
         Concatenation of neighbors.
+    degrees_ : np.ndarray
+        Degree of each node.
+    weights_ : np.ndarray
+        Weight of each node as a common neighbor (inverse of the log of its degree).
 
     Examples
     --------
@@ -370,17 +563,17 @@ class AdamicAdar(FirstOrder):
     >>> aa = AdamicAdar()
     >>> similarities = aa.fit_predict(adjacency, 0)
     >>> similarities.round(2)
-    array([1.82, 0.91, 0.91, 0.91, 0.91])
+    array([1.82, 0.91, 0.91, 0.91, 0.91], dtype=float32)
     >>> similarities = aa.predict([0, 1])
     >>> similarities.round(2)
     array([[1.82, 0.91, 0.91, 0.91, 0.91],
-           [0.91, 3.8 , 0.  , 2.35, 1.44]])
+           [0.91, 3.8 , 0.  , 2.35, 1.44]], dtype=float32)
     >>> similarities = aa.predict((0, 1))
     >>> similarities.round(2)
     0.91
     >>> similarities = aa.predict([(0, 1), (1, 2)])
     >>> similarities.round(2)
-    array([0.91, 0.  ])
+    array([0.91, 0.  ], dtype=float32)
 
     References
     ----------
@@ -391,14 +584,23 @@ class AdamicAdar(FirstOrder):
     def __init__(self):
         super(AdamicAdar, self).__init__()
 
-    def _predict_base(self, source: int, targets: Iterable):
-        """Prediction for a single node."""
-        return np.asarray(adamic_adar_node_core(self.indptr_, self.indices_, np.int32(source),
-                                                np.array(targets, dtype=np.int32)))
+    def fit(self, adjacency: Union[sparse.csr_matrix, np.ndarray]):
+        """Fit algorithm to the data.
 
-    def _predict_edges(self, edges: np.ndarray):
-        """Prediction for multiple edges."""
-        return np.asarray(adamic_adar_edges_core(self.indptr_, self.indices_, edges.astype(np.int32)))
+        Parameters
+        ----------
+        adjacency :
+            Adjacency matrix of the graph
+
+        Returns
+        -------
+        self : :class:`AdamicAdar`
+        """
+        super(AdamicAdar, self).fit(adjacency)
+        log_degrees = np.log(self.degrees_, out=np.zeros(len(self.degrees_)), where=self.degrees_ > 0)
+        self.weights_ = _divide(1, log_degrees).astype(np.float32)
+
+        return self
 
 
 class ResourceAllocation(FirstOrder):
@@ -412,6 +614,10 @@ class ResourceAllocation(FirstOrder):
         Pointer index for neighbors.
     indices_ : np.ndarray
         Concatenation of neighbors.
+    degrees_ : np.ndarray
+        Degree of each node.
+    weights_ : np.ndarray
+        Weight of each node as a common neighbor (inverse of its degree).
 
     Examples
     --------
@@ -420,17 +626,17 @@ class ResourceAllocation(FirstOrder):
     >>> ra = ResourceAllocation()
     >>> similarities = ra.fit_predict(adjacency, 0)
     >>> similarities.round(2)
-    array([0.67, 0.33, 0.33, 0.33, 0.33])
+    array([0.67, 0.33, 0.33, 0.33, 0.33], dtype=float32)
     >>> similarities = ra.predict([0, 1])
     >>> similarities.round(2)
     array([[0.67, 0.33, 0.33, 0.33, 0.33],
-           [0.33, 1.33, 0.  , 0.83, 0.5 ]])
+           [0.33, 1.33, 0.  , 0.83, 0.5 ]], dtype=float32)
     >>> similarities = ra.predict((0, 1))
     >>> similarities.round(2)
     0.33
     >>> similarities = ra.predict([(0, 1), (1, 2)])
     >>> similarities.round(2)
-    array([0.33, 0.  ])
+    array([0.33, 0.  ], dtype=float32)
 
     References
     ----------
@@ -442,14 +648,22 @@ class ResourceAllocation(FirstOrder):
     def __init__(self):
         super(ResourceAllocation, self).__init__()
 
-    def _predict_base(self, source: int, targets: Iterable):
-        """Prediction for a single node."""
-        return np.asarray(resource_allocation_node_core(self.indptr_, self.indices_, np.int32(source),
-                                                        np.array(targets, dtype=np.int32)))
+    def fit(self, adjacency: Union[sparse.csr_matrix, np.ndarray]):
+        """Fit algorithm to the data.
 
-    def _predict_edges(self, edges: np.ndarray):
-        """Prediction for multiple edges."""
-        return np.asarray(resource_allocation_edges_core(self.indptr_, self.indices_, edges.astype(np.int32)))
+        Parameters
+        ----------
+        adjacency :
+            Adjacency matrix of the graph
+
+        Returns
+        -------
+        self : :class:`ResourceAllocation`
+        """
+        super(ResourceAllocation, self).fit(adjacency)
+        self.weights_ = _divide(1, self.degrees_).astype(np.float32)
+
+        return self
 
 
 class PreferentialAttachment(FirstOrder):
@@ -463,6 +677,8 @@ class PreferentialAttachment(FirstOrder):
         Pointer index for neighbors.
     indices_ : np.ndarray
         Concatenation of neighbors.
+    degrees_ : np.ndarray
+        Degree of each node.
 
     Examples
     --------
@@ -492,15 +708,47 @@ class PreferentialAttachment(FirstOrder):
     def __init__(self):
         super(PreferentialAttachment, self).__init__()
 
-    def _predict_base(self, source: int, targets: Iterable):
+    def _predict_base(self, source: int, targets: np.ndarray):
+        """Prediction for a single node and multiple targets (contiguous int32 array)."""
+        return self.degrees_[source] * self.degrees_[targets]
+
+    def _predict_node(self, source: int):
         """Prediction for a single node."""
-        deg_src = self.indptr_[source+1] - self.indptr_[source]
-        tgt = np.array(targets)
-        deg_tgt = self.indptr_[tgt+1] - self.indptr_[tgt]
-        return deg_src * deg_tgt
+        return self.degrees_[source] * self.degrees_
+
+    def _predict_nodes(self, nodes: np.ndarray):
+        """Prediction for multiple nodes."""
+        return self._predict_batch(np.asarray(nodes, dtype=int))
 
     def _predict_edges(self, edges: np.ndarray):
         """Prediction for multiple edges."""
-        deg_src = self.indptr_[edges[:, 0] + 1] - self.indptr_[edges[:, 0]]
-        deg_tgt = self.indptr_[edges[:, 1] + 1] - self.indptr_[edges[:, 1]]
-        return deg_src * deg_tgt
+        return self.degrees_[edges[:, 0]] * self.degrees_[edges[:, 1]]
+
+    def _predict_batch(self, sources: np.ndarray, parallel: bool = False):
+        """Prediction for multiple sources and all targets."""
+        return np.outer(self.degrees_[sources], self.degrees_)
+
+    def predict_all(self, return_sparse: Union[bool, str] = 'auto') -> Union[np.ndarray, sparse.csr_matrix]:
+        """Compute similarity scores for all pairs of nodes.
+
+        Parameters
+        ----------
+        return_sparse :
+            * If ``True``, return a sparse matrix, with non-zero scores for pairs of non-isolated nodes only.
+            * If ``False``, return a dense array.
+            * If ``'auto'``, return a sparse matrix if less than half of the pairs of nodes have non-zero scores,
+              a dense array otherwise.
+
+        Returns
+        -------
+        predictions : np.ndarray or sparse.csr_matrix
+            Prediction scores, of shape (n_nodes, n_nodes).
+        """
+        if not (isinstance(return_sparse, bool) or return_sparse == 'auto'):
+            raise ValueError("return_sparse must be True, False or 'auto'.")
+        n = len(self.degrees_)
+        n_active = np.count_nonzero(self.degrees_)
+        if return_sparse is True or (return_sparse == 'auto' and n_active * n_active < n * n / 2):
+            degrees = sparse.csr_matrix(self.degrees_)
+            return degrees.T.dot(degrees).tocsr()
+        return np.outer(self.degrees_, self.degrees_)
@@ -6,100 +6,261 @@
 Created on July, 2020
 @author: Nathan de Lara <ndelara@enst.fr>
 """
-from libc.math cimport log, sqrt
-from libcpp.vector cimport vector
-
-ctypedef float (*int2float)(int)
-ctypedef float (*vectors2float)(vector[int], vector[int])
-
-
-cdef float inv(int a):
-    """Inverse function"""
-    return 1 / a
-
-
-cdef float inv_log(int a):
-    """Inverse of log function"""
-    return 1 / log(a)
-
-
-cdef vector[int] vector_intersection(vector[int] a, vector[int] b):
-    """Common elements in two sorted vectors. Each element is assumed unique in each vector."""
-    cdef vector[int] intersection
-    cdef int e_a, e_b
-    cdef int ix_a = 0
-    cdef int ix_b = 0
-    cdef int size_a = a.size()
-    cdef int size_b = b.size()
-
-    while ix_a < size_a and ix_b < size_b:
-        e_a = a[ix_a]
-        e_b = b[ix_b]
-
-        if e_a < e_b:
-            ix_a += 1
-        elif e_b < e_a:
-            ix_b += 1
+import numpy as np
+from cython.parallel import prange
+
+cimport cython
+cimport numpy as np
+
+# node indices, stored on 16 bits for graphs of less than 65536 nodes
+ctypedef fused index_t:
+    np.uint16_t
+    np.int32_t
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef int gallop(index_t* a, int start, int size, index_t value) nogil:
+    """Index of the first element not smaller than value in a sorted array, searching from start by exponential
+    then binary search."""
+    cdef int low = start
+    cdef int high
+    cdef int middle
+    cdef int step = 1
+
+    if start >= size or a[start] >= value:
+        return start
+    # a[low] < value
+    high = low + step
+    while high < size and a[high] < value:
+        low = high
+        step *= 2
+        high = low + step
+    if high > size:
+        high = size
+    # a[low] < value <= a[high]
+    while high - low > 1:
+        middle = (low + high) >> 1
+        if a[middle] < value:
+            low = middle
         else:
-            intersection.push_back(e_a)
-            ix_a += 1
-            ix_b += 1
-
-    return intersection
-
-
-cdef float size_intersection(vector[int] a, vector[int] b):
-    """Size of the intersection of two vectors"""
-    return vector_intersection(a, b).size()
-
-
-cdef float jaccard(vector[int] a, vector[int] b):
-    """Jaccard coefficient"""
-    cdef float size_inter = size_intersection(a, b)
-    cdef float size_union = a.size() + b.size() - size_inter
-    return size_inter / size_union
-
-
-cdef float salton(vector[int] a, vector[int] b):
-    """Salton coefficient"""
-    cdef float size_inter = size_intersection(a, b)
-    return size_inter / sqrt(a.size() * b.size())
-
-
-cdef float sorensen(vector[int] a, vector[int] b):
-    """Sorensen coefficient"""
-    cdef float size_inter = size_intersection(a, b)
-    return 2 * size_inter / (a.size() + b.size())
-
-
-cdef float hub_promoted(vector[int] a, vector[int] b):
-    """Hub promoted coefficient"""
-    cdef float size_inter = size_intersection(a, b)
-    return size_inter / min(a.size(), b.size())
-
-
-cdef float hub_depressed(vector[int] a, vector[int] b):
-    """Hub promoted coefficient"""
-    cdef float size_inter = size_intersection(a, b)
-    return size_inter / max(a.size(), b.size())
-
-
-cdef vector[int] neighbors(int[:] indptr, int[:] indices, int node):
-    """Neighbors of a given node"""
-    cdef int j1 = indptr[node]
-    cdef int j2 = indptr[node + 1]
-    cdef int j
-    cdef vector[int] neigh = ()
-
-    for j in range(j1, j2):
-        neigh.push_back(indices[j])
-
-    return neigh
-
-
-cdef vector[float] predict_node_core(int[:] indptr, int[:] indices, int source, int[:] targets,
-                                       vectors2float weight_func):
-    """Scores based on global information about common neighbors for a single source.
+            high = middle
+
+    return high
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef long gallop_count(index_t* a, int size_a, index_t* b, int size_b) nogil:
+    """Number of common elements in two sorted arrays, searching each element of the (short) array a
+    in the (long) array b."""
+    cdef int i
+    cdef int j = 0
+    cdef long count = 0
+
+    for i in range(size_a):
+        j = gallop(b, j, size_b, a[i])
+        if j == size_b:
+            break
+        if b[j] == a[i]:
+            count += 1
+            j += 1
+
+    return count
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef float gallop_weight(index_t* a, int size_a, index_t* b, int size_b, float[::1] weights) nogil:
+    """Total weight of the common elements in two sorted arrays, searching each element of the (short) array a
+    in the (long) array b."""
+    cdef int i
+    cdef int j = 0
+    cdef float weight = 0
+
+    for i in range(size_a):
+        j = gallop(b, j, size_b, a[i])
+        if j == size_b:
+            break
+        if b[j] == a[i]:
+            weight += weights[a[i]]
+            j += 1
+
+    return weight
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef long scan_count(index_t* a, int size_a, index_t* b, int size_b) nogil:
+    """Number of common elements in two short arrays, by a branch-free comparison of all pairs."""
+    cdef int i, j
+    cdef long count = 0
+
+    for i in range(size_a):
+        for j in range(size_b):
+            count += a[i] == b[j]
+
+    return count
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef float scan_weight(index_t* a, int size_a, index_t* b, int size_b, float[::1] weights) nogil:
+    """Total weight of the common elements in two short arrays, by a branch-free comparison of all pairs."""
+    cdef int i, j
+    cdef int found
+    cdef float weight = 0
+
+    for i in range(size_a):
+        found = 0
+        for j in range(size_b):
+            found += a[i] == b[j]
+        weight += found * weights[a[i]]
+
+    return weight
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef long intersect_count(index_t* a, int size_a, index_t* b, int size_b) nogil:
+    """Number of common elements in two sorted arrays. Each element is assumed unique in each array.
+    Use a linear merge, a galloping search if one array is more than 8 times longer than the other,
+    or a comparison of all pairs if there are at most 64 of them."""
+    cdef int i = 0
+    cdef int j = 0
+    cdef long count = 0
+
+    if size_a * <long> size_b <= 64:
+        return scan_count(a, size_a, b, size_b)
+    if 8 * <long> size_a < size_b:
+        return gallop_count(a, size_a, b, size_b)
+    if 8 * <long> size_b < size_a:
+        return gallop_count(b, size_b, a, size_a)
+
+    while i < size_a and j < size_b:
+        if a[i] < b[j]:
+            i += 1
+        elif b[j] < a[i]:
+            j += 1
+        else:
+            count += 1
+            i += 1
+            j += 1
+
+    return count
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef float intersect_weight(index_t* a, int size_a, index_t* b, int size_b, float[::1] weights) nogil:
+    """Total weight of the common elements in two sorted arrays. Each element is assumed unique in each array.
+    Use a linear merge, a galloping search if one array is more than 8 times longer than the other,
+    or a comparison of all pairs if there are at most 64 of them."""
+    cdef int i = 0
+    cdef int j = 0
+    cdef float weight = 0
+
+    if size_a * <long> size_b <= 64:
+        return scan_weight(a, size_a, b, size_b, weights)
+    if 8 * <long> size_a < size_b:
+        return gallop_weight(a, size_a, b, size_b, weights)
+    if 8 * <long> size_b < size_a:
+        return gallop_weight(b, size_b, a, size_a, weights)
+
+    while i < size_a and j < size_b:
+        if a[i] < b[j]:
+            i += 1
+        elif b[j] < a[i]:
+            j += 1
+        else:
+            weight += weights[a[i]]
+            i += 1
+            j += 1
+
+    return weight
+
+
+cdef inline long popcount(np.uint64_t x) nogil:
+    """Number of bits set in a 64-bit word (SWAR, compiled to a single instruction where available)."""
+    x = x - ((x >> 1) & 0x5555555555555555ULL)
+    x = (x & 0x3333333333333333ULL) + ((x >> 2) & 0x3333333333333333ULL)
+    x = (x + (x >> 4)) & 0x0F0F0F0F0F0F0F0FULL
+    return <long> ((x * 0x0101010101010101ULL) >> 56)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline bint has_bit(np.uint64_t[:, ::1] bitsets, int hub, int node) nogil:
+    """Check whether a node belongs to the neighborhood of a hub, given as a bitset."""
+    return (bitsets[hub, node >> 6] >> (node & 63)) & 1
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef long intersection_size(int[::1] indptr, index_t[::1] indices, int[::1] hub_index, np.uint64_t[:, ::1] bitsets,
+                            int a, int b) nogil:
+    """Number of common neighbors of two nodes.
+
+    Neighborhoods of hubs (nodes with ``hub_index >= 0``) are also available as bitsets: two hubs are intersected by
+    popcount of the bitwise AND, a node and a hub by testing the bits of the node's neighbors."""
+    cdef int i = indptr[a]
+    cdef int j = indptr[b]
+    cdef int i_end = indptr[a + 1]
+    cdef int j_end = indptr[b + 1]
+    cdef int hub_a = hub_index[a]
+    cdef int hub_b = hub_index[b]
+    cdef int w
+    cdef long size = 0
+
+    if hub_a >= 0 and hub_b >= 0:
+        for w in range(bitsets.shape[1]):
+            size += popcount(bitsets[hub_a, w] & bitsets[hub_b, w])
+    elif hub_b >= 0:
+        for i in range(i, i_end):
+            size += has_bit(bitsets, hub_b, indices[i])
+    elif hub_a >= 0:
+        for j in range(j, j_end):
+            size += has_bit(bitsets, hub_a, indices[j])
+    elif i < i_end and j < j_end:
+        size = intersect_count(&indices[i], i_end - i, &indices[j], j_end - j)
+
+    return size
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef float intersection_weight(int[::1] indptr, index_t[::1] indices, int[::1] hub_index, np.uint64_t[:, ::1] bitsets,
+                                float[::1] weights, int a, int b) nogil:
+    """Total weight of the common neighbors of two nodes.
+
+    If one of the nodes is a hub, the neighbors of the other node are tested against its bitset."""
+    cdef int i = indptr[a]
+    cdef int j = indptr[b]
+    cdef int i_end = indptr[a + 1]
+    cdef int j_end = indptr[b + 1]
+    cdef int hub_a = hub_index[a]
+    cdef int hub_b = hub_index[b]
+    cdef float weight = 0
+
+    if hub_b >= 0 and (hub_a < 0 or i_end - i <= j_end - j):
+        for i in range(i, i_end):
+            if has_bit(bitsets, hub_b, indices[i]):
+                weight += weights[indices[i]]
+    elif hub_a >= 0:
+        for j in range(j, j_end):
+            if has_bit(bitsets, hub_a, indices[j]):
+                weight += weights[indices[j]]
+    elif i < i_end and j < j_end:
+        weight = intersect_weight(&indices[i], i_end - i, &indices[j], j_end - j, weights)
+
+    return weight
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def intersections_node_core(int[::1] indptr, index_t[::1] indices, int[::1] hub_index, np.uint64_t[:, ::1] bitsets,
+                            int source, int[::1] targets, np.int64_t[::1] out):
+    """Number of common neighbors of a source with each target.
 
     Parameters
     ----------
@@ -107,35 +268,37 @@ cdef vector[float] predict_node_core(int[:] indptr, int[:] indices, int source,
         indptr array of the adjacency matrix
     indices :
         indices array of the adjacency matrix
+    hub_index :
+        index of each node in the array of bitsets (-1 if none)
+    bitsets :
+        neighborhoods of hubs as bitsets, of shape (n_hubs, n_words)
     source :
         source index
     targets :
         array of target indices
-    weight_func :
-        scoring function to be used
-
-    Returns
-    -------
-    scores :
-        vector of node pair scores
+    out :
+        array of shape (n_targets,) where to write the numbers of common neighbors
     """
-    cdef int target, i
     cdef int n_targets = targets.shape[0]
-    cdef vector[float] preds
+    cdef int i, target
+    cdef index_t* neighbors_source = &indices[indptr[source]]
+    cdef int degree_source = indptr[source + 1] - indptr[source]
+    cdef bint hub_source = hub_index[source] >= 0
 
-    cdef vector[int] neigh_s = neighbors(indptr, indices, source)
-    cdef vector[int] neigh_t
     for i in range(n_targets):
         target = targets[i]
-        neigh_t = neighbors(indptr, indices, target)
-        preds.push_back(weight_func(neigh_s, neigh_t))
-
-    return preds
+        if hub_source or hub_index[target] >= 0:
+            out[i] = intersection_size(indptr, indices, hub_index, bitsets, source, target)
+        else:
+            out[i] = intersect_count(neighbors_source, degree_source,
+                                     &indices[indptr[target]], indptr[target + 1] - indptr[target])
 
 
-cdef vector[float] predict_edges_core(int[:] indptr, int[:] indices, int[:, :] edges,
-                                       vectors2float weight_func):
-    """Scores based on global information about common neighbors for a list of edges.
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def intersections_edges_core(int[::1] indptr, index_t[::1] indices, int[::1] hub_index, np.uint64_t[:, ::1] bitsets,
+                             int[:, ::1] edges, np.int64_t[::1] out):
+    """Number of common neighbors for each node pair.
 
     Parameters
     ----------
@@ -143,80 +306,41 @@ cdef vector[float] predict_edges_core(int[:] indptr, int[:] indices, int[:, :] e
         indptr array of the adjacency matrix
     indices :
         indices array of the adjacency matrix
-    edges:
+    hub_index :
+        index of each node in the array of bitsets (-1 if none)
+    bitsets :
+        neighborhoods of hubs as bitsets, of shape (n_hubs, n_words)
+    edges :
         array of node pairs to be scored
-    weight_func :
-        scoring function to be used
-
-    Returns
-    -------
-    scores :
-        vector of node pair scores
+    out :
+        array of shape (n_edges,) where to write the numbers of common neighbors
     """
-
-    cdef vector[float] preds
-    cdef int source, target, i
-
     cdef int n_edges = edges.shape[0]
+    cdef int i, source, target
+    cdef int source_prev = -1
+    cdef index_t* neighbors_source = NULL
+    cdef int degree_source = 0
+
     for i in range(n_edges):
         source, target = edges[i, 0], edges[i, 1]
-        neigh_s = neighbors(indptr, indices, source)
-        neigh_t = neighbors(indptr, indices, target)
-        preds.push_back(weight_func(neigh_s, neigh_t))
-
-    return preds
-
-def common_neighbors_node_core(int[:] indptr, int[:] indices, int source, int[:] targets):
-    """Number of common neighbors"""
-    return predict_node_core(indptr, indices, source, targets, size_intersection)
-
-def common_neighbors_edges_core(int[:] indptr, int[:] indices, int[:, :] edges):
-    """Number of common neighbors"""
-    return predict_edges_core(indptr, indices, edges, size_intersection)
-
-def jaccard_node_core(int[:] indptr, int[:] indices, int source, int[:] targets):
-    """Jaccard coefficient of common neighbors"""
-    return predict_node_core(indptr, indices, source, targets, jaccard)
-
-def jaccard_edges_core(int[:] indptr, int[:] indices, int[:, :] edges):
-    """Number of common neighbors"""
-    return predict_edges_core(indptr, indices, edges, jaccard)
-
-def salton_node_core(int[:] indptr, int[:] indices, int source, int[:] targets):
-    """Salton coefficient of common neighbors"""
-    return predict_node_core(indptr, indices, source, targets, salton)
-
-def salton_edges_core(int[:] indptr, int[:] indices, int[:, :] edges):
-    """Salton coefficient of common neighbors"""
-    return predict_edges_core(indptr, indices, edges, salton)
-
-def sorensen_node_core(int[:] indptr, int[:] indices, int source, int[:] targets):
-    """Sorensen coefficient of common neighbors"""
-    return predict_node_core(indptr, indices, source, targets, sorensen)
-
-def sorensen_edges_core(int[:] indptr, int[:] indices, int[:, :] edges):
-    """Sorensen coefficient of common neighbors"""
-    return predict_edges_core(indptr, indices, edges, sorensen)
-
-def hub_promoted_node_core(int[:] indptr, int[:] indices, int source, int[:] targets):
-    """Hub promoted coefficient of common neighbors"""
-    return predict_node_core(indptr, indices, source, targets, hub_promoted)
-
-def hub_promoted_edges_core(int[:] indptr, int[:] indices, int[:, :] edges):
-    """Hub promoted coefficient of common neighbors"""
-    return predict_edges_core(indptr, indices, edges, hub_promoted)
-
-def hub_depressed_node_core(int[:] indptr, int[:] indices, int source, int[:] targets):
-    """Hub depressed coefficient of common neighbors"""
-    return predict_node_core(indptr, indices, source, targets, hub_depressed)
-
-def hub_depressed_edges_core(int[:] indptr, int[:] indices, int[:, :] edges):
-    """Hub depressed coefficient of common neighbors"""
-    return predict_edges_core(indptr, indices, edges, hub_depressed)
-
-cdef vector[float] predict_node_weighted_core(int[:] indptr, int[:] indices, int source, int[:] targets,
-                                              int2float weight_func):
-    """Scores based on the degrees of common neighbors for a single source.
+        if hub_index[source] >= 0 or hub_index[target] >= 0:
+            out[i] = intersection_size(indptr, indices, hub_index, bitsets, source, target)
+            continue
+        # consecutive edges of the same source (edges sorted by source) share its neighborhood
+        if source != source_prev:
+            neighbors_source = &indices[indptr[source]]
+            degree_source = indptr[source + 1] - indptr[source]
+            source_prev = source
+        out[i] = intersect_count(neighbors_source, degree_source,
+                                 &indices[indptr[target]], indptr[target + 1] - indptr[target])
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def weighted_intersections_node_core(int[::1] indptr, index_t[::1] indices, int[::1] hub_index,
+                                     np.uint64_t[:, ::1] bitsets, int source, int[::1] targets, float[::1] weights,
+                                     float[::1] out):
+    """Total weight of the common neighbors of a source with each target.
 
     Parameters
     ----------
@@ -224,42 +348,40 @@ cdef vector[float] predict_node_weighted_core(int[:] indptr, int[:] indices, int
         indptr array of the adjacency matrix
     indices :
         indices array of the adjacency matrix
+    hub_index :
+        index of each node in the array of bitsets (-1 if none)
+    bitsets :
+        neighborhoods of hubs as bitsets, of shape (n_hubs, n_words)
     source :
         source index
     targets :
         array of target indices
-    weight_func :
-        scoring function to be used
-
-    Returns
-    -------
-    scores :
-        vector of node pair scores
+    weights :
+        weight of each node as a common neighbor
+    out :
+        array of shape (n_targets,) where to write the scores
     """
-    cdef int target, i, j
     cdef int n_targets = targets.shape[0]
-    cdef float weight
-    cdef vector[int] intersection
-    cdef vector[float] preds
+    cdef int i, target
+    cdef index_t* neighbors_source = &indices[indptr[source]]
+    cdef int degree_source = indptr[source + 1] - indptr[source]
+    cdef bint hub_source = hub_index[source] >= 0
 
-    cdef vector[int] neigh_s = neighbors(indptr, indices, source)
-    cdef vector[int] neigh_t
     for i in range(n_targets):
         target = targets[i]
-        neigh_t = neighbors(indptr, indices, target)
-        intersection = vector_intersection(neigh_s, neigh_t)
-
-        weight = 0
-        for j in intersection:
-            weight += weight_func(indptr[j+1] - indptr[j])
-        preds.push_back(weight)
-
-    return preds
+        if hub_source or hub_index[target] >= 0:
+            out[i] = intersection_weight(indptr, indices, hub_index, bitsets, weights, source, target)
+        else:
+            out[i] = intersect_weight(neighbors_source, degree_source,
+                                      &indices[indptr[target]], indptr[target + 1] - indptr[target], weights)
 
 
-cdef vector[float] predict_edges_weighted_core(int[:] indptr, int[:] indices, int[:, :] edges,
-                                               int2float weight_func):
-    """Scores based on the degrees of common neighbors for a list of edges.
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def weighted_intersections_edges_core(int[::1] indptr, index_t[::1] indices, int[::1] hub_index,
+                                      np.uint64_t[:, ::1] bitsets, int[:, ::1] edges, float[::1] weights,
+                                      float[::1] out):
+    """Total weight of the common neighbors for each node pair.
 
     Parameters
     ----------
@@ -267,49 +389,109 @@ cdef vector[float] predict_edges_weighted_core(int[:] indptr, int[:] indices, in
         indptr array of the adjacency matrix
     indices :
         indices array of the adjacency matrix
-    edges:
+    hub_index :
+        index of each node in the array of bitsets (-1 if none)
+    bitsets :
+        neighborhoods of hubs as bitsets, of shape (n_hubs, n_words)
+    edges :
         array of node pairs to be scored
-    weight_func :
-        scoring function to be used
-
-    Returns
-    -------
-    scores :
-        vector of node pair scores
+    weights :
+        weight of each node as a common neighbor
+    out :
+        array of shape (n_edges,) where to write the scores
     """
-    cdef vector[float] preds
-    cdef int source, target, i
-    cdef float weight
-    cdef vector[int] intersection
-
     cdef int n_edges = edges.shape[0]
-    for i in range(n_edges):
-        source, target = edges[i][0], edges[i][1]
-        neigh_s = neighbors(indptr, indices, source)
-        neigh_t = neighbors(indptr, indices, target)
-
-        intersection = vector_intersection(neigh_s, neigh_t)
+    cdef int i, source, target
+    cdef int source_prev = -1
+    cdef index_t* neighbors_source = NULL
+    cdef int degree_source = 0
 
-        weight = 0
-        for j in intersection:
-            weight += weight_func(indptr[j+1] - indptr[j])
-        preds.push_back(weight)
-
-    return preds
-
-
-def adamic_adar_node_core(int[:] indptr, int[:] indices, int source, int[:] targets):
-    """Adamic Adar index"""
-    return predict_node_weighted_core(indptr, indices, source, targets, inv_log)
+    for i in range(n_edges):
+        source, target = edges[i, 0], edges[i, 1]
+        if hub_index[source] >= 0 or hub_index[target] >= 0:
+            out[i] = intersection_weight(indptr, indices, hub_index, bitsets, weights, source, target)
+            continue
+        # consecutive edges of the same source (edges sorted by source) share its neighborhood
+        if source != source_prev:
+            neighbors_source = &indices[indptr[source]]
+            degree_source = indptr[source + 1] - indptr[source]
+            source_prev = source
+        out[i] = intersect_weight(neighbors_source, degree_source,
+                                  &indices[indptr[target]], indptr[target + 1] - indptr[target], weights)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def intersections_batch_core(int[::1] indptr, index_t[::1] indices, int[::1] indptr_transpose,
+                             index_t[::1] indices_transpose, int[::1] sources, np.int64_t[:, ::1] out):
+    """Number of common neighbors of each source with each node, in parallel over sources.
+    Each row is accumulated from the in-neighbors of the neighbors of the source, in time proportional to the sum
+    of the in-degrees of these neighbors.
 
-def adamic_adar_edges_core(int[:] indptr, int[:] indices, int[:, :] edges):
-    """Adamic Adar index"""
-    return predict_edges_weighted_core(indptr, indices, edges, inv_log)
+    Parameters
+    ----------
+    indptr :
+        indptr array of the adjacency matrix
+    indices :
+        indices array of the adjacency matrix
+    indptr_transpose :
+        indptr array of the transpose of the adjacency matrix
+    indices_transpose :
+        indices array of the transpose of the adjacency matrix
+    sources :
+        array of source indices
+    out :
+        array of shape (n_sources, n_nodes) where to write the scores
+    """
+    cdef int n_sources = sources.shape[0]
+    cdef int n = indptr.shape[0] - 1
+    cdef int i, j, k, neighbor, target
+
+    for i in prange(n_sources, nogil=True, schedule='dynamic'):
+        for target in range(n):
+            out[i, target] = 0
+        for j in range(indptr[sources[i]], indptr[sources[i] + 1]):
+            neighbor = indices[j]
+            for k in range(indptr_transpose[neighbor], indptr_transpose[neighbor + 1]):
+                out[i, indices_transpose[k]] += 1
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def weighted_intersections_batch_core(int[::1] indptr, index_t[::1] indices, int[::1] indptr_transpose,
+                                      index_t[::1] indices_transpose, int[::1] sources, float[::1] weights,
+                                      float[:, ::1] out):
+    """Total weight of the common neighbors of each source with each node, in parallel over sources.
+    Each row is accumulated from the in-neighbors of the neighbors of the source, in time proportional to the sum
+    of the in-degrees of these neighbors.
 
-def resource_allocation_node_core(int[:] indptr, int[:] indices, int source, int[:] targets):
-    """Resource Allocation index"""
-    return predict_node_weighted_core(indptr, indices, source, targets, inv)
+    Parameters
+    ----------
+    indptr :
+        indptr array of the adjacency matrix
+    indices :
+        indices array of the adjacency matrix
+    indptr_transpose :
+        indptr array of the transpose of the adjacency matrix
+    indices_transpose :
+        indices array of the transpose of the adjacency matrix
+    sources :
+        array of source indices
+    weights :
+        weight of each node as a common neighbor
+    out :
+        array of shape (n_sources, n_nodes) where to write the scores
+    """
+    cdef int n_sources = sources.shape[0]
+    cdef int n = indptr.shape[0] - 1
+    cdef int i, j, k, neighbor, target
+    cdef float weight
 
-def resource_allocation_edges_core(int[:] indptr, int[:] indices, int[:, :] edges):
-    """Resource Allocation index"""
-    return predict_edges_weighted_core(indptr, indices, edges, inv)
+    for i in prange(n_sources, nogil=True, schedule='dynamic'):
+        for target in range(n):
+            out[i, target] = 0
+        for j in range(indptr[sources[i]], indptr[sources[i] + 1]):
+            neighbor = indices[j]
+            weight = weights[neighbor]
+            for k in range(indptr_transpose[neighbor], indptr_transpose[neighbor + 1]):
+                out[i, indices_transpose[k]] += weight
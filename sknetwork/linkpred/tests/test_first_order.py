@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""tests for first order link prediction"""
+import unittest
+
+import numpy as np
+from scipy import sparse
+
+from sknetwork.data import house, karate_club, painters
+from sknetwork.utils import directed2undirected, edgelist2adjacency
+from sknetwork.linkpred import CommonNeighbors, JaccardIndex, SaltonIndex, SorensenIndex, HubPromotedIndex, \
+    HubDepressedIndex, AdamicAdar, ResourceAllocation, PreferentialAttachment
+
+
+class TestFirstOrder(unittest.TestCase):
+
+    def setUp(self):
+        self.algos = [CommonNeighbors(), JaccardIndex(), SaltonIndex(), SorensenIndex(), HubPromotedIndex(),
+                      HubDepressedIndex(), AdamicAdar(), ResourceAllocation(), PreferentialAttachment()]
+
+    def test_batch(self):
+        adjacency = karate_club()
+        # add isolated nodes
+        adjacency_disconnect = sparse.block_diag([adjacency, sparse.csr_matrix((3, 3))], format='csr')
+        for adjacency in [adjacency, adjacency_disconnect]:
+            n = adjacency.shape[0]
+            nodes = np.array([0, 1, n - 1])
+            for algo in self.algos:
+                algo.fit(adjacency)
+                self.assertGreater(n, algo.batch_threshold)
+                preds = algo.predict(nodes)
+                self.assertEqual(preds.shape, (len(nodes), n))
+                for i, node in enumerate(nodes):
+                    self.assertAlmostEqual(np.abs(algo.predict(int(node)) - preds[i]).max(), 0, places=4)
+                    targets = np.arange(n, dtype=np.int32)
+                    self.assertAlmostEqual(np.abs(algo._predict_base(node, targets) - preds[i]).max(), 0, places=4)
+
+    def test_predict_all(self):
+        for adjacency in [karate_club(), painters()]:
+            n = adjacency.shape[0]
+            for algo in self.algos:
+                algo.fit(adjacency)
+                preds = algo.predict_all(return_sparse=False)
+                self.assertEqual(preds.shape, (n, n))
+                self.assertAlmostEqual(np.abs(algo.predict(np.arange(n)) - preds).max(), 0, places=4)
+                preds_sparse = algo.predict_all(return_sparse=True).toarray()
+                self.assertAlmostEqual(np.abs(preds_sparse - preds).max(), 0, places=4)
+
+    def test_bitsets(self):
+        adjacency = karate_club()
+        n = adjacency.shape[0]
+        targets = np.arange(n, dtype=np.int32)
+        edges = np.array([(i, j) for i in range(n) for j in range(n)])
+        for algo in self.algos:
+            algo.fit(adjacency)
+            preds = algo.predict(np.arange(n))
+            algo.bitset_threshold = 4
+            algo.fit(adjacency)
+            hub_index, bitsets = algo._bitsets()
+            hubs = np.flatnonzero(hub_index >= 0)
+            self.assertEqual(bitsets.shape, (len(hubs), 1))
+            self.assertTrue(len(hubs))
+            for hub in hubs:
+                bits = (bitsets[hub_index[hub], 0] >> np.arange(n, dtype=np.uint64)) & np.uint64(1)
+                self.assertTrue((bits == adjacency[hub].toarray().ravel()).all())
+            for node in [0, 1, 9]:
+                self.assertAlmostEqual(np.abs(algo._predict_base(node, targets) - preds[node]).max(), 0, places=4)
+            self.assertAlmostEqual(np.abs(algo.predict(edges) - preds.ravel()).max(), 0, places=4)
+
+    def test_skewed_degrees(self):
+        # star-like graph: leaves of small degree, hubs of large degree
+        edges = [(i, j) for i in range(3) for j in range(3, 100)] + [(3, 4), (5, 6), (7, 50)]
+        adjacency = directed2undirected(edgelist2adjacency(edges))
+        n = adjacency.shape[0]
+        for algo in self.algos:
+            algo.fit(adjacency)
+            preds = algo.predict(np.arange(n))
+            self.assertAlmostEqual(np.abs(algo.predict_all(return_sparse=False) - preds).max(), 0, places=4)
+            edges = np.array([(i, j) for i in [0, 3, 7] for j in range(n)])
+            self.assertAlmostEqual(np.abs(algo.predict(edges) - preds[edges[:, 0], edges[:, 1]]).max(), 0, places=4)
+
+    def test_dtype(self):
+        algo = CommonNeighbors()
+        for adjacency in [house(), karate_club()]:
+            algo.fit(adjacency)
+            n = adjacency.shape[0]
+            self.assertEqual(algo.predict(0).dtype, np.int64)
+            self.assertEqual(algo.predict([0, 1]).dtype, np.int64)
+            self.assertEqual(algo.predict([(0, 1), (1, 2)]).dtype, np.int64)
+            self.assertEqual(algo.predict_all(return_sparse=False).dtype, np.int64)
+            self.assertEqual(algo._predict_base(0, np.arange(n, dtype=np.int32)).dtype, np.int64)
+
+    def test_unsorted_indices(self):
+        adjacency = karate_club()
+        n = adjacency.shape[0]
+        preds = CommonNeighbors().fit_predict(adjacency, np.arange(n))
+        # reverse the order of neighbors in each row
+        indptr = adjacency.indptr
+        indices = np.concatenate([adjacency.indices[indptr[i]:indptr[i + 1]][::-1] for i in range(n)])
+        adjacency = sparse.csr_matrix((adjacency.data, indices, indptr), shape=(n, n))
+        self.assertFalse(adjacency.has_sorted_indices)
+        algo = CommonNeighbors().fit(adjacency)
+        self.assertTrue((algo.predict(np.arange(n)) == preds).all())
+        self.assertTrue((algo.predict_all(return_sparse=False) == preds).all())
+
+    def test_return_sparse(self):
+        adjacency = karate_club()
+        # add isolated nodes
+        adjacency_disconnect = sparse.block_diag([adjacency, sparse.csr_matrix((40, 40))], format='csr')
+        for adjacency in [adjacency, adjacency_disconnect]:
+            for algo in self.algos:
+                algo.fit(adjacency)
+                preds = algo.predict_all(return_sparse=False)
+                self.assertIsInstance(preds, np.ndarray)
+                preds_sparse = algo.predict_all(return_sparse=True)
+                self.assertTrue(sparse.isspmatrix_csr(preds_sparse))
+                self.assertAlmostEqual(np.abs(preds_sparse.toarray() - preds).max(), 0, places=4)
+                preds_auto = algo.predict_all()
+                if sparse.issparse(preds_auto):
+                    self.assertLess(preds_auto.nnz, preds.size / 2)
+                    preds_auto = preds_auto.toarray()
+                self.assertAlmostEqual(np.abs(preds_auto - preds).max(), 0, places=4)
+                for return_sparse in ['dense', 0, 1]:
+                    self.assertRaises(ValueError, algo.predict_all, return_sparse)
+
+    def test_index_dtype(self):
+        adjacency = karate_club()
+        n = adjacency.shape[0]
+        # more than 65536 nodes: neighbors stored on 32 bits
+        adjacency_large = sparse.block_diag([adjacency, sparse.csr_matrix((1 << 16, 1 << 16))], format='csr')
+        edges = np.array([(i, j) for i in [0, 1, 33] for j in range(n)])
+        for algo in self.algos:
+            algo.fit(adjacency)
+            self.assertEqual(algo.indices_.dtype, np.uint16)
+            preds = algo.predict(edges)
+            preds_node = algo._predict_base(0, np.arange(n, dtype=np.int32))
+            algo.fit(adjacency_large)
+            self.assertEqual(algo.indices_.dtype, np.int32)
+            self.assertAlmostEqual(np.abs(algo.predict(edges) - preds).max(), 0, places=4)
+            self.assertAlmostEqual(np.abs(algo._predict_base(0, np.arange(n, dtype=np.int32)) - preds_node).max(), 0,
+                                   places=4)
+
+    def test_duplicate_edges(self):
+        adjacency = karate_club()
+        edges = np.array([(5, 1), (0, 2), (5, 1), (33, 0), (0, 2), (0, 33), (2, 0)])
+        for algo in self.algos:
+            algo.fit(adjacency)
+            preds = algo.predict(edges)
+            self.assertEqual(preds.shape, (len(edges),))
+            for i, (source, target) in enumerate(edges):
+                self.assertAlmostEqual(preds[i], algo.predict((int(source), int(target))), places=4)
+
+    def test_empty_query(self):
+        for adjacency in [house(), karate_club()]:
+            n = adjacency.shape[0]
+            for algo in self.algos:
+                algo.fit(adjacency)
+                self.assertEqual(algo.predict([]).shape, (0, n))
+
+    def test_rectangular(self):
+        biadjacency = sparse.random(20, 50, density=0.2, format='csr', random_state=0)
+        for algo in self.algos:
+            self.assertRaises(ValueError, algo.fit, biadjacency)
+
+    def test_node_range(self):
+        adjacency = karate_club()
+        n = adjacency.shape[0]
+        # preferential attachment only indexes degrees
+        for algo in self.algos[:-1]:
+            algo.fit(adjacency)
+            for query in [n, -1, [0, n], (0, 10 ** 6), (-1, 0), [(0, 40), (1, 2)], [(1, 2), (-1, 3)]]:
+                self.assertRaises(ValueError, algo.predict, query)